@@ -157,8 +157,7 @@ class SirilAlignInterface(QWidget):
                 aligned_filename = os.path.splitext(file)[0] + "-aligned.fits"
                 if os.path.isfile(aligned_filename):
                     self.siril.log(f"Overwriting existing aligned file: {aligned_filename}")
-                    os.remove(aligned_filename)
-                os.rename(f"{ALIGN_WORKING_DIR}/r_align_{seqnum:04d}.fits", aligned_filename)
+                os.replace(f"{ALIGN_WORKING_DIR}/r_align_{seqnum:04d}.fits", aligned_filename)
                 seqnum += 1
 
             self.siril.log(f"Aligned {len(input_files)} file(s)", s.LogColor.GREEN)
@@ -28,6 +28,9 @@ import numpy as np
 
 denoiseExecutable = "C:/Program Files/SetiAstroSuitePro/setiastrosuitepro.exe"
 
+# progress percentage in Cosmic Clarity's stdout, e.g. b'42%'
+PROGRESS_RE = re.compile(rb'(\d+)%')
+
 class SirilDenoiseInterface(QWidget):
     _enable_apply = pyqtSignal()
 
@@ -37,6 +40,10 @@ class SirilDenoiseInterface(QWidget):
         self.setFixedWidth(400)
         self.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint, True)
 
+        # one event loop on one daemon thread, reused for every apply
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run_loop, daemon=True).start()
+
         # Initialize Siril connection
         self.siril = s.SirilInterface()
 
@@ -50,6 +57,11 @@ class SirilDenoiseInterface(QWidget):
         self._enable_apply.connect(lambda: self.apply_btn.setEnabled(True))
         self.CreateWidgets()
 
+    def closeEvent(self, event):
+        # stop the worker loop, its thread closes it on the way out
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        super().closeEvent(event)
+
     def CreateWidgets(self):
         """Create the GUI widgets for the Cosmic Clarity Denoise interface."""
         layout = QVBoxLayout()
@@ -158,7 +170,22 @@ class SirilDenoiseInterface(QWidget):
             QMessageBox.critical(self, "Error", "No image loaded!")
             return
         self.apply_btn.setEnabled(False)
-        threading.Thread(target=lambda: asyncio.run(self.ApplyChanges()), daemon=True).start()
+        future = asyncio.run_coroutine_threadsafe(self.ApplyChanges(), self._loop)
+        future.add_done_callback(self._on_apply_done)
+
+    def _run_loop(self):
+        """Worker thread body: run the apply event loop until closeEvent stops it."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+        self._loop.close()
+
+    def _on_apply_done(self, future):
+        """Report anything that escaped ApplyChanges(), nothing else would see it on the worker."""
+        if future.cancelled() or future.exception() is None:
+            return
+        self.siril.log(f"Unhandled exception in ApplyChanges(): {str(future.exception())}", s.LogColor.SALMON)
+        self._enable_apply.emit()
+        self.siril.reset_progress()
 
     async def RunCosmicClarity(self, inputFile, outputFile):
         """Run Cosmic Clarity denoise."""
@@ -195,17 +222,22 @@ class SirilDenoiseInterface(QWidget):
                 stderr=sys.stderr,
             )
 
-            buffer = ""
+            buffer = b""
             while True:
                 chunk = await process.stdout.read(80)
                 if not chunk:
                     break
 
-                buffer += chunk.decode('utf-8', errors='ignore')
-                lines = buffer.split('\r')
+                # only complete lines can hold a progress update
+                buffer += chunk
+                if b'\r' not in chunk:
+                    continue
+                lines = buffer.split(b'\r')
 
                 for line in lines[:-1]:
-                    match = re.search(r'(\d+)%', line)
+                    if b'%' not in line:
+                        continue
+                    match = PROGRESS_RE.search(line)
                     if match:
                         percentage = float(match.group(1))
                         self.siril.update_progress("Denoising...", percentage / 100)
@@ -232,6 +264,8 @@ class SirilDenoiseInterface(QWidget):
     async def ApplyChanges(self):
         pre_stretch = self.pre_stretch_check.isChecked()
         m = self.pre_stretch_spin.value() if pre_stretch else None
+        # the finally block below runs even if we fail before the temp names are known
+        inputFile = outputFile = ""
 
         try:
             # Claim the processing thread
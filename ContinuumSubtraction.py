@@ -1,4 +1,4 @@
-# Narrowband Continuum Subtraction script - JAX Optimized
+# Narrowband Continuum Subtraction script
 # SPDX-License-Identifier: GPL-3.0
 # Author: Adrian Knagg-Baugh, (c) 2025
 # Author: Dave Lindner (c) 2025 lindner234 <AT> gmail
@@ -25,6 +25,11 @@ user-selected region using AAD (Average Absolute Deviation).
 # 3.0.5 CR: Reduce vertical spacing for more compact interface
 # 3.0.6 Copy FITS header to generated files, add history entry for CS operation
 # 3.0.7 Get rid of the FUGLY collasible widgets
+# 3.0.8 Performance: fewer full size temporaries when generating the CS image
+#       Estimate c by a bounded Brent minimization of the AAD instead of the sweep + smooth-V fit
+#       (c values can differ slightly), the sweep and fit are now only computed for the plot
+#       Estimate and blend run on worker threads, the plot figure is built off the UI thread
+#       Loaded FITS frames are cached (up to 8 float32 frames stay in memory)
 
 
 import sirilpy as s
@@ -36,25 +41,40 @@ s.ensure_installed("matplotlib")
 
 import os
 import sys
+import threading
 import numpy as np
-import matplotlib.pyplot as plt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QFileDialog, QMessageBox, QGroupBox, QCheckBox, QSlider,
     QTextEdit, QComboBox, QMainWindow
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 from astropy.io import fits
-from scipy.optimize import curve_fit
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
 
-version = "v3.0.6"
+version = "v3.0.8"
+
+# rows per band when blending, ~1-2 MB of float32 for typical sensor widths
+BLEND_ROWS = 64
+
+# images kept in the read cache, enough for Ha/SII/OIII, R/G/B and the CS image
+FITS_CACHE_SIZE = 8
+
+# size of the (scale factors, pixels) residual block the AAD sweep works on, small enough to stay in cache
+SWEEP_BLOCK_BYTES = 4 * 1024 * 1024
 
 def _siril_quoted_path(path: str) -> str:
     """Quote a filesystem path for Siril command parsing."""
     return '"' + str(path).replace("\\", "\\\\").replace('"', '\\"') + '"'
 
+def _read_fits(path: str) -> np.ndarray:
+    """Read the image data of a FITS file as C contiguous native float32, memory mapping the file."""
+    # FITS data is big endian, the conversion byteswaps into a native array the in-place ufuncs
+    # can vectorize. Data astropy already scaled to native float32 is returned as is
+    return np.ascontiguousarray(fits.getdata(path, memmap=True), dtype=np.float32)
+
 # Simple collapsible group widget
 class CollapsibleGroup(QWidget):
     def __init__(self, title: str, parent=None):
@@ -87,6 +107,11 @@ class CollapsibleGroup(QWidget):
         QTimer.singleShot(0, lambda: (self.window().adjustSize() if self.window() is not None else self.adjustSize()))
 
 class SirilCSWindow(QWidget):
+    _set_controls_enabled = pyqtSignal(bool)
+    _show_error = pyqtSignal(str, str)  # (title, message)
+    _show_plot = pyqtSignal(object)  # callable to run on the UI thread
+    _estimate_complete = pyqtSignal(float)  # (c)
+
     def __init__(self):
         """ Constructor for our UI class """
         super().__init__()
@@ -121,8 +146,23 @@ class SirilCSWindow(QWidget):
         self.component_file = ""
         self.cs_file = ""
 
+        # image data already read from disk, keyed by path -> (mtime, data), least recently used first
+        self._fits_cache = OrderedDict()
+        self._fits_cache_lock = threading.Lock()
+        # (inputs, c) of the last estimate
+        self._last_estimate = None
+        # ((path, mtime), median) of the last CS image blended
+        self._cs_median = None
+        # (3, height, width) blend output, reused while the image size stays the same
+        self._blend_out = None
+
         self.create_ui()
 
+        self._set_controls_enabled.connect(self._on_set_controls_enabled)
+        self._show_error.connect(lambda title, msg: QMessageBox.critical(self, title, msg))
+        self._show_plot.connect(lambda show: show())
+        self._estimate_complete.connect(self.on_estimate_complete)
+
     def create_ui(self):
         layout = QVBoxLayout()
         self.setLayout(layout)
@@ -246,11 +286,11 @@ class SirilCSWindow(QWidget):
         btn_row = QHBoxLayout()
         load_btn = QPushButton("Load")
         load_btn.clicked.connect(self.on_load)
-        estimate_btn = QPushButton("Estimate")
-        estimate_btn.clicked.connect(self.on_estimate)
+        self.estimate_btn = QPushButton("Estimate")
+        self.estimate_btn.clicked.connect(self.on_estimate)
         self.plot_check_box = QCheckBox("Plot Solution")
         btn_row.addWidget(load_btn)
-        btn_row.addWidget(estimate_btn)
+        btn_row.addWidget(self.estimate_btn)
         btn_row.addWidget(self.plot_check_box)
         btn_row.addStretch()
         csgen_box.layout().addLayout(btn_row)
@@ -265,17 +305,17 @@ class SirilCSWindow(QWidget):
         c_row.addWidget(self.c_slider)
         self.c_value_label = QLabel(f"{self.c_slider.value() / 10000:.4f}")
         c_row.addWidget(self.c_value_label)
-        self.c_slider.valueChanged.connect(lambda v: self.c_value_label.setText(f"{v / 10000:.4f}"))
+        self.coalesce_label(self.c_slider, self.c_value_label, lambda v: f"{v / 10000:.4f}")
         csgen_box.layout().addLayout(c_row)
         csgen_box.layout().addSpacing(5)
         
         # generate button
         gen_btn_row = QHBoxLayout()
         gen_btn_row.setAlignment(Qt.AlignmentFlag.AlignHCenter|Qt.AlignmentFlag.AlignVCenter)
-        gen_btn = QPushButton("Generate")
-        gen_btn.clicked.connect(self.on_generate)
-        gen_btn.setFixedWidth(80)
-        gen_btn_row.addWidget(gen_btn)
+        self.gen_btn = QPushButton("Generate")
+        self.gen_btn.clicked.connect(self.on_generate)
+        self.gen_btn.setFixedWidth(80)
+        gen_btn_row.addWidget(self.gen_btn)
         csgen_box.layout().addLayout(gen_btn_row)
 
         # add the group to main layout
@@ -302,7 +342,7 @@ class SirilCSWindow(QWidget):
         q_row.addWidget(self.q_slider)
         self.q_value_label = QLabel(f"{self.q_slider.value() / 100:.2f}")
         q_row.addWidget(self.q_value_label)
-        self.q_slider.valueChanged.connect(lambda v: self.q_value_label.setText(f"{v / 100:.2f}"))
+        self.coalesce_label(self.q_slider, self.q_value_label, lambda v: f"{v / 100:.2f}")
         blend_box.layout().addLayout(q_row)
         blend_box.layout().addSpacing(6)
 
@@ -323,7 +363,7 @@ class SirilCSWindow(QWidget):
         self.red_value_label.setFixedWidth(VALUE_LABEL_WIDTH)
         self.red_value_label.setAlignment(Qt.AlignmentFlag.AlignRight)
         red_slider_row.addWidget(self.red_value_label)
-        self.red_slider.valueChanged.connect(lambda v: self.red_value_label.setText(f"{v}%"))
+        self.coalesce_label(self.red_slider, self.red_value_label, lambda v: f"{v}%")
         blend_box.layout().addLayout(red_slider_row)
 
        # optional green channel blending slider
@@ -339,7 +379,7 @@ class SirilCSWindow(QWidget):
         self.green_value_label.setFixedWidth(VALUE_LABEL_WIDTH)
         self.green_value_label.setAlignment(Qt.AlignmentFlag.AlignRight)
         green_slider_row.addWidget(self.green_value_label)
-        self.green_slider.valueChanged.connect(lambda v: self.green_value_label.setText(f"{v}%"))
+        self.coalesce_label(self.green_slider, self.green_value_label, lambda v: f"{v}%")
         blend_box.layout().addLayout(green_slider_row)
 
         # optional blue channel blending slider
@@ -355,21 +395,35 @@ class SirilCSWindow(QWidget):
         self.blu_value_label.setFixedWidth(VALUE_LABEL_WIDTH)
         self.blu_value_label.setAlignment(Qt.AlignmentFlag.AlignRight)
         blu_slider_row.addWidget(self.blu_value_label)
-        self.blu_slider.valueChanged.connect(lambda v: self.blu_value_label.setText(f"{v}%"))
+        self.coalesce_label(self.blu_slider, self.blu_value_label, lambda v: f"{v}%")
         blend_box.layout().addLayout(blu_slider_row)
         blend_box.layout().addSpacing(5)
 
         # Blend button
         blend_btn_row = QHBoxLayout()
         blend_btn_row.setAlignment(Qt.AlignmentFlag.AlignHCenter|Qt.AlignmentFlag.AlignVCenter)
-        blend_btn = QPushButton("Blend")
-        blend_btn.clicked.connect(self.on_blend)
-        blend_btn.setFixedWidth(80)
-        blend_btn_row.addWidget(blend_btn)
+        self.blend_btn = QPushButton("Blend")
+        self.blend_btn.clicked.connect(self.on_blend)
+        self.blend_btn.setFixedWidth(80)
+        blend_btn_row.addWidget(self.blend_btn)
         blend_box.layout().addLayout(blend_btn_row)
 
         layout.addWidget(blend_box)
 
+    def coalesce_label(self, slider, label, fmt):
+        """ Helper to update a slider's value label at most once per frame while dragging """
+        timer = QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(16)
+        timer.timeout.connect(lambda: label.setText(fmt(slider.value())))
+        slider.valueChanged.connect(lambda _: timer.isActive() or timer.start())
+
+    def _on_set_controls_enabled(self, enabled):
+        """ Enable/disable the buttons that read or write image files while a worker thread runs """
+        self.estimate_btn.setEnabled(enabled)
+        self.gen_btn.setEnabled(enabled)
+        self.blend_btn.setEnabled(enabled)
+
     def add_file_row(self, label_text, lineedit, label_width):
         """ Helper to create a file selection row """
         row = QHBoxLayout()
@@ -393,6 +447,36 @@ class SirilCSWindow(QWidget):
             return
         self.siril.cmd("load", _siril_quoted_path(self.emission_file))
 
+    def read_fits_cached(self, path):
+        """ Read a FITS image as float32, reusing the previous read while the file is unchanged """
+        mtime = os.stat(path).st_mtime_ns
+        with self._fits_cache_lock:
+            cached = self._fits_cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                self._fits_cache.move_to_end(path)
+                return cached[1]
+
+        data = _read_fits(path)
+        self.cache_fits(path, mtime, data)
+        return data
+
+    def read_fits_region(self, path, region):
+        """ Read part of a FITS image as contiguous float32, returns (image shape, region data) """
+        mtime = os.stat(path).st_mtime_ns
+        with self._fits_cache_lock:
+            cached = self._fits_cache.get(path)
+        # slice the memory mapped file before converting, only the region is read from disk
+        data = cached[1] if cached is not None and cached[0] == mtime else fits.getdata(path, memmap=True)
+        return data.shape, np.ascontiguousarray(data[region], dtype=np.float32)
+
+    def cache_fits(self, path, mtime, data):
+        """ Add image data to the read cache, dropping the least recently used image when full """
+        with self._fits_cache_lock:
+            self._fits_cache[path] = (mtime, data)
+            self._fits_cache.move_to_end(path)
+            while len(self._fits_cache) > FITS_CACHE_SIZE:
+                self._fits_cache.popitem(last=False)
+
     def on_emission_changed(self, text: str):
         """ Drop-down callback for selection change"""
         if text == "Ha":
@@ -431,14 +515,19 @@ class SirilCSWindow(QWidget):
             return
 
         try:
-            component_data = fits.getdata(self.component_file)
-            emission_data = fits.getdata(self.emission_file)
-            cs_data = emission_data - c * component_data
+            component_data = self.read_fits_cached(self.component_file)
+            emission_data = self.read_fits_cached(self.emission_file)
+
+            # cs = emission - c * component, computed in a single float32 buffer
+            cs_data = np.empty(emission_data.shape, dtype=np.float32)
+            np.multiply(component_data, np.float32(c), out=cs_data)
+            np.subtract(emission_data, cs_data, out=cs_data)
 
             out_name = "CS-generated.fits"
             self.cs_file = out_name
             hdu = fits.PrimaryHDU(cs_data)
-            hdu.writeto(out_name, overwrite=True)
+            hdu.writeto(out_name, overwrite=True, output_verify='ignore')
+            self.cache_fits(out_name, os.stat(out_name).st_mtime_ns, cs_data)
 
             # Load into Siril
             self.siril.cmd("load", _siril_quoted_path(out_name))
@@ -447,49 +536,76 @@ class SirilCSWindow(QWidget):
             QMessageBox.critical(self, "Error", f"Error generating continuum subtracted image:\n{e}")
 
     def on_blend(self):
+        """ Blend button callback. Blend the CS image into RGB on a worker thread, and load into Siril """
         if not all([self.r_file, self.g_file, self.b_file, self.cs_file]):
             QMessageBox.warning(self, "Missing components", "Please select R, G, B and ensure the continuum subtracted image is generated.")
             return
 
-        try:
-            q = self.q_slider.value() / 100.0
-            red_adjust = self.red_slider.value() / 100.0
-            blue_adjust = self.blu_slider.value() / 100.0
-            green_adjust = self.green_slider.value() / 100.0
-
-            r_data = fits.getdata(self.r_file).astype(np.float32)
-            g_data = fits.getdata(self.g_file).astype(np.float32)
-            b_data = fits.getdata(self.b_file).astype(np.float32)
-            cs_data = fits.getdata(self.cs_file).astype(np.float32)
+        q = self.q_slider.value() / 100.0
+        red_adjust = self.red_slider.value() / 100.0
+        blue_adjust = self.blu_slider.value() / 100.0
+        green_adjust = self.green_slider.value() / 100.0
+        c = self.c_slider.value() / 10000.0
 
-            cs_median = np.median(cs_data)
-            new_rdata = r_data + (cs_data - cs_median) * q * red_adjust
-            new_gdata = g_data + (cs_data - cs_median) * q * green_adjust
-            new_bdata = b_data + (cs_data - cs_median) * q * blue_adjust
+        self._on_set_controls_enabled(False)
+        threading.Thread(
+            target=self._blend_worker,
+            args=(q, (red_adjust, green_adjust, blue_adjust), c),
+            daemon=True
+        ).start()
 
-            # Ensure output shape (3, height, width) as Siril expects planes-first format
-            combined_data = np.array([new_rdata, new_gdata, new_bdata], dtype=np.float32)
+    def _blend_worker(self, q, adjusts, c):
+        """ Worker thread: blend the CS image into R, G and B, write the result and load it into Siril """
+        try:
+            # read the (uncached) files in parallel, reading overlaps with float32 conversion
+            with ThreadPoolExecutor(max_workers=4) as ex:
+                r_data, g_data, b_data, cs_data = ex.map(
+                    self.read_fits_cached, (self.r_file, self.g_file, self.b_file, self.cs_file))
+
+            # re-blending the same CS image with new sliders reuses its median
+            cs_key = (self.cs_file, os.stat(self.cs_file).st_mtime_ns)
+            if self._cs_median is None or self._cs_median[0] != cs_key:
+                self._cs_median = (cs_key, sample_median(cs_data))
+            cs_median = self._cs_median[1]
+
+            # Siril expects planes-first format (3, height, width), build each plane in place. The
+            # buffer is kept between blends, a fresh one would be page faulted in on every blend
+            shape = (3,) + cs_data.shape
+            if self._blend_out is None or self._blend_out.shape != shape:
+                self._blend_out = np.empty(shape, dtype=np.float32)
+            combined_data = self._blend_out
+            channels = tuple(zip((r_data, g_data, b_data), adjusts))
+
+            # rows blend independently and NumPy releases the GIL, so split the image
+            # into one block of rows per thread. A few threads saturate memory bandwidth
+            height = cs_data.shape[0]
+            workers = min(4, os.cpu_count() or 1)
+            step = -(-height // workers)
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(
+                    lambda start: blend_rows(cs_data, cs_median, q, channels, combined_data, start, min(start + step, height)),
+                    range(0, height, step)))
 
             # grab the fits header from one of the input files (R)
             with fits.open(self.r_file) as hdul:
                 header = hdul[0].header
 
-            c = self.c_slider.value() / 10000.0
             header.add_history(f"Continuum subtracted: emission={os.path.basename(self.emission_file)} c={c:.4f}")
 
             out_name = "CS-RGB-blended.fits"
             hdu = fits.PrimaryHDU(combined_data, header=header)
-            hdu.writeto(out_name, overwrite=True)
+            hdu.writeto(out_name, overwrite=True, output_verify='ignore')
 
             # Load into Siril
             self.siril.cmd("load", _siril_quoted_path(out_name))
 
         except Exception as e:
-            QMessageBox.critical(self, "Error", f"Error during blending:\n{e}")
+            self._show_error.emit("Error", f"Error during blending:\n{e}")
+
+        finally:
+            self._set_controls_enabled.emit(True)
 
     def on_estimate(self):
-        c_median = 0.0
-        
         with self.siril.image_lock():
             if not self.siril.is_image_loaded():
                 QMessageBox.warning(self, "Missing Image", "Color component image not loaded in Siril")
@@ -499,8 +615,7 @@ class SirilCSWindow(QWidget):
                 QMessageBox.warning(self, "Invalid Image", "Loaded image does not match selected emission image")
                 return
             
-            # get the median of the selected region in the current image, also warn user
-            # if they have not selected a region
+            # warn user if they have not selected a region
             selection = self.siril.get_siril_selection()
             if selection is None or selection[2] <= 0 or selection[3] <= 0:
                 shape = self.siril.get_image_shape()
@@ -509,80 +624,135 @@ class SirilCSWindow(QWidget):
                                "It is recommended to make a generous selection around the object of "
                                "interest.", s.LogColor.SALMON)
 
-            c_median = self.siril.get_selection_stats(selection, 0).median
+        # unchanged files and selection give the same c, so a repeat click can skip the
+        # optimization (unless the user wants to see the plot again)
+        plot_optimization = self.plot_check_box.isChecked()
+        estimate_key = (
+            self.emission_file, os.stat(self.emission_file).st_mtime_ns,
+            self.component_file, os.stat(self.component_file).st_mtime_ns,
+            tuple(selection)
+        )
+        if self._last_estimate is not None and self._last_estimate[0] == estimate_key and not plot_optimization:
+            self.on_estimate_complete(self._last_estimate[1])
+            return
 
-        # load the narrowband and continuum data
-        narrowband_data = fits.getdata(self.emission_file)
-        continuum_data = fits.getdata(self.component_file)
+        # the optimization takes a while on large selections, keep the UI responsive
+        self._on_set_controls_enabled(False)
+        threading.Thread(
+            target=self._estimate_worker,
+            args=(estimate_key, selection, plot_optimization),
+            daemon=True
+        ).start()
 
-        # verify shapes match, e.g. same dimensions, mono images, etc.
-        if continuum_data.shape != narrowband_data.shape:
-            QMessageBox.critical(self, "Mismatched Images", "Image sizes and types must match.")
-            return
-        
-        c = self.compute_c(
-            narrowband_data,
-            continuum_data,
-            selection,
-            c_median,
-            self.plot_check_box.isChecked()
-        )
+    def _estimate_worker(self, estimate_key, selection, plot_optimization):
+        """ Worker thread: load the narrowband and continuum data and compute c """
+        try:
+            # load only the selected region of the narrowband and continuum data
+            x, y, w, h = selection
+            region = (slice(y, y + h), slice(x, x + w))
+            with ThreadPoolExecutor(max_workers=2) as ex:
+                (narrowband_shape, nb), (continuum_shape, co) = ex.map(
+                    lambda path: self.read_fits_region(path, region), (self.emission_file, self.component_file))
+
+            # verify shapes match, e.g. same dimensions, mono images, etc.
+            if continuum_shape != narrowband_shape:
+                self._show_error.emit("Mismatched Images", "Image sizes and types must match.")
+                return
+
+            c = self.compute_c(nb, co, plot_optimization)
+            self._last_estimate = (estimate_key, c)
+            self._estimate_complete.emit(c)
 
+        except Exception as e:
+            self._show_error.emit("Error", f"Error estimating continuum scale:\n{e}")
+
+        finally:
+            self._set_controls_enabled.emit(True)
+
+    def on_estimate_complete(self, c):
+        """ Apply the estimated c and generate the continuum subtracted image """
         print(f"Estimated c: {c:.4f}")
         self.c_slider.setValue(int(round(c * 10000)))
         self.on_generate()
 
-    def compute_c(self, narrowband_image, continuum_image, selection, c_median, plot_optimization):
-        """ Compute the optimal continuum scaling factor c """
-        x, y, w, h = selection
-        def slc(im): return im[y:y+h, x:x+w]
-        nb = slc(narrowband_image)
-        co = slc(continuum_image)
-
-        approx_min = find_min(nb, co, c_median, self.siril)
-        max_val = approx_min + 1.0
-        min_val = approx_min - 1.0
-
-        scale_factors = np.linspace(min_val, max_val, 40)
-        aad_values = []
-
-        for i, sf in enumerate(scale_factors):
-            value = aad(nb - (co - c_median) * sf)
-            aad_values.append(value)
-            self.siril.update_progress("Optimizing continuum subtraction...", i / (len(scale_factors) - 1))
-        self.siril.reset_progress()
-
-        def smooth_v(x, A, s0, eps, B):
-            return A * np.sqrt((x - s0)**2 + eps**2) + B
-
-        B0 = np.min(aad_values)
-        s0_0 = scale_factors[np.argmin(aad_values)]
-        slope_est = (aad_values[-1] - aad_values[0]) / (scale_factors[-1] - scale_factors[0])
-        A0 = slope_est
-        eps0 = 0.01
-        p0 = [A0, s0_0, eps0, B0]
-        lb = [-1.0, 0.00, 0.0, 0.00]
-        ub = [np.inf, 2*max_val, np.inf, np.inf]
-
-        popt, _ = curve_fit(smooth_v, scale_factors, aad_values, p0=p0, bounds=(lb, ub))
-        A_opt, s0_opt, eps_opt, B_opt = popt
-        c = float(np.clip(s0_opt, 0, 1))
+    def compute_c(self, nb, co, plot_optimization):
+        """ Compute the optimal continuum scaling factor c from the selected region of both images """
+        # scipy is imported on first use, it is slow to import and not needed to open the window
+        from scipy.optimize import curve_fit, minimize_scalar
+
+        # center both regions once. The mean of nb - co * sf is mean(nb) - sf * mean(co), so
+        # the AAD for any sf is then just mean(|nb - co * sf|) on the centered data
+        nb = center(nb)
+        co = center(co)
+
+        # AAD is convex in the scale factor, so the best c in [0, 1] is simply the bounded
+        # minimum over [0, 1], no coarse search needed. Brent gets there in 10-30 AAD passes
+        residual = np.empty(min(nb.size, SWEEP_BLOCK_BYTES // nb.itemsize), dtype=np.float32)
+        res = minimize_scalar(lambda sf: aad(nb, co, sf, residual),
+                              bounds=(0.0, 1.0), method='bounded', options={'xatol': 1e-5})
+        # a NaN in the selection makes every AAD NaN, and Brent then just stops at its first probe
+        if not res.success or not np.isfinite(res.fun):
+            raise ValueError("AAD minimization failed, check the selection for NaN or infinite pixels")
+        c = float(res.x)
 
         if plot_optimization and self is not None:
-            def show_plot():
-                fig, ax = plt.subplots(figsize=(10, 6))
-                ax.scatter(scale_factors, aad_values, color='C0', alpha=0.6, label='AAD values')
+            # the sweep and smooth-V fit are only needed to draw the plot
+            max_val = c + 1.0
+            min_val = c - 1.0
+            scale_factors = np.linspace(min_val, max_val, 40)
+            aad_values = aad_sweep(nb, co, scale_factors, self.siril, "Optimizing continuum subtraction...")
+            min_aad = aad(nb, co, c, residual)
+
+            def smooth_v(x, A, s0, eps, B):
+                return A * np.sqrt((x - s0)**2 + eps**2) + B
+
+            def smooth_v_jac(x, A, s0, eps, B):
+                # partials wrt A, s0, eps and B, saves curve_fit the finite difference evaluations
+                r = np.maximum(np.sqrt((x - s0)**2 + eps**2), 1e-12)
+                return np.stack([r, -A * (x - s0) / r, A * eps / r, np.ones_like(x)], axis=1)
+
+            B0 = np.min(aad_values)
+            # the sweep can dip below 0 when c is clipped there, keep the start inside the bounds
+            s0_0 = max(scale_factors[np.argmin(aad_values)], 0.0)
+            slope_est = (aad_values[-1] - aad_values[0]) / (scale_factors[-1] - scale_factors[0])
+            A0 = slope_est
+            eps0 = 0.01
+            lb = [-1.0, 0.00, 0.0, 0.00]
+            ub = [np.inf, 2*max_val, np.inf, np.inf]
+            # on ADU scaled data the slope estimate can fall outside its bounds, curve_fit rejects that start
+            p0 = np.clip([A0, s0_0, eps0, B0], lb, ub)
+
+            # the fit is only drawn, no need for curve_fit's default 1e-8 tolerances. The parameters
+            # differ in scale by ~10x, x_scale='jac' lets trf rescale them from the Jacobian.
+            # c comes from Brent, so a failed fit just leaves the curve off the plot
+            try:
+                popt, _ = curve_fit(smooth_v, scale_factors, aad_values, p0=p0, bounds=(lb, ub),
+                                    jac=smooth_v_jac, x_scale='jac', xtol=1e-6, ftol=1e-6)
+            except (RuntimeError, ValueError) as e:
+                popt = None
+                self.siril.log(f"Smooth-V fit failed, plotting the AAD values only: {e}", s.LogColor.SALMON)
+
+            # matplotlib is only imported when a plot is requested. The figure is built here on the
+            # worker thread, the Qt canvas that draws it (and redraws on resize and at the screen's
+            # pixel ratio) is attached on the UI thread
+            from matplotlib.figure import Figure
+
+            fig = Figure(figsize=(10, 6))
+            ax = fig.subplots()
+            ax.scatter(scale_factors, aad_values, color='C0', alpha=0.6, label='AAD values')
+            if popt is not None:
                 fx = np.linspace(min_val, max_val, 500)
-                fy = smooth_v(fx, *popt)
-                ax.plot(fx, fy, 'C3-', label="Smooth-V fit")
-                min_aad = smooth_v(c, *popt)
-                ax.plot([c], [min_aad], 'go', ms=10, label=f'Optimal scale = {c:.4f}')
-                ax.axvline(c, color='green', ls='--', alpha=0.5)
-                ax.set_title('Optimization for Continuum Subtraction')
-                ax.set_xlabel('Scale Factor')
-                ax.set_ylabel('AAD')
-                ax.grid(alpha=0.3)
-                ax.legend(loc='best')
+                ax.plot(fx, smooth_v(fx, *popt), 'C3-', label="Smooth-V fit")
+            ax.plot([c], [min_aad], 'go', ms=10, label=f'Optimal scale = {c:.4f}')
+            ax.axvline(c, color='green', ls='--', alpha=0.5)
+            ax.set_title('Optimization for Continuum Subtraction')
+            ax.set_xlabel('Scale Factor')
+            ax.set_ylabel('AAD')
+            ax.grid(alpha=0.3)
+            ax.legend(loc='best')
+
+            def show_plot():
+                from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
 
                 plot_window = QMainWindow(self)
                 plot_window.setWindowTitle("Continuum Subtraction Optimization")
@@ -594,26 +764,78 @@ class SirilCSWindow(QWidget):
                 plot_window.resize(800, 600)
                 plot_window.show()
 
-            QTimer.singleShot(0, show_plot)
+            # the plot window has to be created on the UI thread
+            self._show_plot.emit(show_plot)
 
         return c
 
-def aad(data):
-    mean = np.mean(data)
-    return np.mean(np.abs(data - mean))
-
-def find_min(nb, co, c_median, siril):
-    scale_factors = np.linspace(-1, 5, 12)
-    aad_values = []
-
-    for i, sf in enumerate(scale_factors):
-        value = aad(nb - (co - c_median) * sf)
-        aad_values.append(value)
-        siril.update_progress("Coarse bounds check...", i / (len(scale_factors) - 1))
+def sample_median(data, samples=100_000):
+    """ Median of data, estimated from a fixed random sample of pixels for large images """
+    # the median only recenters the blend offset, a 1e5 pixel sample is indistinguishable
+    # from the full median. Random rather than strided so column patterns can't alias
+    flat = data.ravel()
+    if flat.size <= 2 * samples:
+        return np.median(flat)
+    idx = np.random.default_rng(0).integers(0, flat.size, samples)
+    return np.median(flat[idx])
+
+def blend_rows(cs_data, cs_median, q, channels, out, start, stop):
+    """ Blend rows start:stop of the CS image into the planes of out, channels is ((data, adjust), ...) """
+    # (cs - median) * q is shared by all three channels. Work through the rows in
+    # bands so each band of it is still in cache when applied to R, G and B
+    delta = np.empty((BLEND_ROWS,) + cs_data.shape[1:], dtype=np.float32)
+    for y in range(start, stop, BLEND_ROWS):
+        rows = slice(y, min(y + BLEND_ROWS, stop))
+        band = delta[:rows.stop - y]
+        np.subtract(cs_data[rows], cs_median, out=band)
+        band *= q
+        for plane, (data, adjust) in zip(out, channels):
+            # the single line Ha/SII/OIII presets zero two of the three channels
+            if adjust == 0:
+                plane[rows] = data[rows]
+                continue
+            np.multiply(band, adjust, out=plane[rows])
+            plane[rows] += data[rows]
+
+def center(data):
+    """ Flat float32 copy of data minus its mean """
+    return np.subtract(data.ravel(), np.float32(np.mean(data, dtype=np.float64)))
+
+def aad(nb, co, sf, out):
+    """ Average absolute deviation of nb - co * sf for centered nb and co, out is a scratch buffer """
+    # minimize_scalar passes a float64 sf, which would turn the multiply into a float64 loop
+    sf = np.float32(sf)
+    # work through the pixels in blocks the size of out, the residual never leaves cache
+    total = 0.0
+    for start in range(0, nb.size, out.size):
+        res = out[:min(out.size, nb.size - start)]
+        np.multiply(co[start:start + out.size], sf, out=res)
+        np.subtract(nb[start:start + out.size], res, out=res)
+        total += np.abs(res, out=res).sum(dtype=np.float64)
+    return total / nb.size
+
+def aad_sweep(nb, co, scale_factors, siril, message):
+    """ AAD of nb - co * sf for each scale factor, nb and co are centered and flat """
+    # evaluate every scale factor on one block of pixels at a time, so nb and co are read
+    # from memory once for the whole sweep rather than once per scale factor
+    sf = np.asarray(scale_factors, dtype=np.float32)[:, np.newaxis]
+    block = max(1, SWEEP_BLOCK_BYTES // (len(scale_factors) * nb.itemsize))
+    residual = np.empty((len(scale_factors), min(block, nb.size)), dtype=np.float32)
+    sums = np.zeros(len(scale_factors))
+
+    # each progress update is a round trip to Siril, about ten per sweep is plenty
+    starts = range(0, nb.size, block)
+    step = max(1, len(starts) // 10)
+    for i, start in enumerate(starts):
+        res = residual[:, :min(block, nb.size - start)]
+        np.multiply(co[start:start + block], sf, out=res)
+        np.subtract(nb[start:start + block], res, out=res)
+        sums += np.abs(res, out=res).sum(axis=1, dtype=np.float64)
+        if i % step == 0:
+            siril.update_progress(message, i / len(starts))
     siril.reset_progress()
 
-    min_val = scale_factors[np.argmin(aad_values)]
-    return min_val
+    return sums / nb.size
 
 def main():
     app = QApplication(sys.argv)
@@ -375,10 +375,7 @@ class StackingInterface(QWidget):
         threading.Thread(target=self.ExecuteStacking, daemon=True).start()
 
     def OnClean(self):
-        session_dirs = [
-            entry for entry in sorted(os.listdir(base_path))
-            if os.path.isdir(os.path.join(base_path, entry)) and entry.startswith(prefix)
-        ]
+        session_dirs = sessionDirs(base_path, prefix)
         is_single_session = bool(
             os.path.isdir(os.path.join(base_path, "lights")) and
             os.path.isdir(os.path.join(base_path, "masters")) and
@@ -516,11 +513,7 @@ class StackingInterface(QWidget):
             if not os.path.exists("process"):
                 os.makedirs("process")
 
-            session_dirs = []
-            for entry in sorted(os.listdir(base_path)):
-                full_path = os.path.join(base_path, entry)
-                if os.path.isdir(full_path) and entry.startswith(prefix):
-                    session_dirs.append(entry)
+            session_dirs = sessionDirs(base_path, prefix)
 
             # kind of hacky logic to determine if this is a single-session or not
             if os.path.isdir(os.path.join(base_path, "lights")) and not session_dirs:
@@ -663,6 +656,12 @@ def ShowMsgBox(msg):
         box.setCenterButtons(True)
     return msg.exec()
 
+def sessionDirs(base_path, prefix):
+    """Sorted names of the session directories under base_path"""
+    # scandir's DirEntry.is_dir() uses the d_type from the directory read, no stat per entry
+    with os.scandir(base_path) as it:
+        return sorted(e.name for e in it if e.is_dir() and e.name.startswith(prefix))
+
 def isFitsFile(dirname, basename):
     """isFile helper that handles fits files with either suffix"""
     return any(
@@ -355,10 +355,7 @@ class StackingInterface(QWidget):
 
     def OnClean(self):
         """Clean up process directories"""
-        session_dirs = [
-            entry for entry in sorted(os.listdir(BASE_PATH))
-            if os.path.isdir(os.path.join(BASE_PATH, entry)) and entry.startswith(DIR_PREFIX)
-        ]
+        session_dirs = sessionDirs(BASE_PATH, DIR_PREFIX)
         is_single_session = bool(
             os.path.isdir(os.path.join(BASE_PATH, "lights")) and
             os.path.isdir(os.path.join(BASE_PATH, "masters")) and
@@ -502,11 +499,7 @@ class StackingInterface(QWidget):
                 os.makedirs("process")
 
             # collect a list of session directory that match our prefix
-            session_dirs = []
-            for subdir in sorted(os.listdir(BASE_PATH)):
-                full_path = os.path.join(BASE_PATH, subdir)
-                if os.path.isdir(full_path) and subdir.startswith(DIR_PREFIX):
-                    session_dirs.append(subdir)
+            session_dirs = sessionDirs(BASE_PATH, DIR_PREFIX)
 
             # kind of hacky logic to determine if this is a single-session or not
             if os.path.isdir(os.path.join(BASE_PATH, "lights")) and not session_dirs:
@@ -611,6 +604,12 @@ def ShowMsgBox(msg):
         box.setCenterButtons(True)
     return msg.exec()
 
+def sessionDirs(base_path, prefix):
+    """Sorted names of the session directories under base_path"""
+    # scandir's DirEntry.is_dir() uses the d_type from the directory read, no stat per entry
+    with os.scandir(base_path) as it:
+        return sorted(e.name for e in it if e.is_dir() and e.name.startswith(prefix))
+
 def isFitsFile(dirname, basename):
     """isFile helper that handles fits files with either suffix"""
     return any(
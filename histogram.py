@@ -10,26 +10,34 @@
 #
 
 import sirilpy as s
-s.ensure_installed("astropy")
 s.ensure_installed("numpy")
 s.ensure_installed("matplotlib")
-s.ensure_installed("opencv-python")
 s.ensure_installed("PyQt6")
 
-from astropy.io import fits
-import cv2
 import numpy as np
-import matplotlib.pyplot as plt
+import hashlib
 import os
 import sys
+import threading
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont
 from PyQt6.QtWidgets import QApplication, QMessageBox, QPushButton, QVBoxLayout, QWidget, QFrame
 
+# pixels per channel plane in a block of rows when normalizing and counting. The float path holds
+# the block of all three planes in float64 (24 bytes a pixel, 6 MB) plus bincount's intp copy of
+# one plane (2 MB)
+HIST_BLOCK_PIXELS = 1 << 18
+
+# pyplot figure label, reused while the histogram window stays open
+HIST_FIGURE = "Siril Histogram"
+
 
 class SirilHistogramInterface(QWidget):
     """Simple always-on-top PyQt6 window for generating histograms."""
+    _hist_ready = pyqtSignal(object, str)  # (histograms, title)
+    _hist_failed = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
 
@@ -37,6 +45,8 @@ class SirilHistogramInterface(QWidget):
         self.setFixedSize(128, 60)
         self.setWindowFlag(Qt.WindowType.WindowStaysOnTopHint, True)
         self._drag_offset = None
+        # (image key, histograms) of the last image shown
+        self._hist_cache = None
 
         # Initialize Siril connection
         self.siril = s.SirilInterface()
@@ -56,6 +66,9 @@ class SirilHistogramInterface(QWidget):
 
         self.create_widgets()
 
+        self._hist_ready.connect(self._on_hist_ready)
+        self._hist_failed.connect(self._on_hist_failed)
+
     def create_widgets(self):
         """Creates the GUI widgets for the Histogram Viewer interface."""
         main_layout = QVBoxLayout()
@@ -68,13 +81,13 @@ class SirilHistogramInterface(QWidget):
         self.drag_strip.setCursor(Qt.CursorShape.SizeAllCursor)
         main_layout.addWidget(self.drag_strip)
 
-        histogram_btn = QPushButton("Hist")
-        histogram_btn.setFixedSize(78, 24)
-        btn_font = QFont(histogram_btn.font())
+        self.histogram_btn = QPushButton("Hist")
+        self.histogram_btn.setFixedSize(78, 24)
+        btn_font = QFont(self.histogram_btn.font())
         btn_font.setPointSize(9)
-        histogram_btn.setFont(btn_font)
-        histogram_btn.clicked.connect(self.on_view)
-        main_layout.addWidget(histogram_btn, alignment=Qt.AlignmentFlag.AlignHCenter)
+        self.histogram_btn.setFont(btn_font)
+        self.histogram_btn.clicked.connect(self.on_view)
+        main_layout.addWidget(self.histogram_btn, alignment=Qt.AlignmentFlag.AlignHCenter)
 
         self.setLayout(main_layout)
 
@@ -84,12 +97,36 @@ class SirilHistogramInterface(QWidget):
             QMessageBox.information(self, "Histogram", "No image loaded.")
             return
 
-        data = self.siril.get_image_pixeldata()
-        compute_and_plot_color_hist(
-            data,
-            os.path.basename(self.siril.get_image_filename()),
-            dark=self._is_dark_theme(),
-        )
+        # fetching and binning a large image takes a moment, do it off the UI thread
+        self.histogram_btn.setEnabled(False)
+        threading.Thread(target=self._compute_hist, daemon=True).start()
+
+    def _compute_hist(self):
+        """Worker thread: fetch the current image from Siril and compute its histograms."""
+        try:
+            data = self.siril.get_image_pixeldata()
+            filename = self.siril.get_image_filename()
+
+            # an unchanged image reuses its histograms. Changes are spotted from a ~64k pixel sample,
+            # any processing that would visibly change the histogram touches far more pixels than that
+            sample = data.ravel()[::max(1, data.size // 65536)]
+            key = (filename, data.shape, data.dtype.str, hashlib.blake2b(sample.tobytes(), digest_size=16).digest())
+            if self._hist_cache is None or self._hist_cache[0] != key:
+                self._hist_cache = (key, compute_color_hist(data))
+
+            self._hist_ready.emit(self._hist_cache[1], os.path.basename(filename))
+        except Exception as e:
+            self._hist_failed.emit(str(e))
+
+    def _on_hist_ready(self, hists, title):
+        """Plot the histograms from the worker thread, matplotlib has to run on the UI thread."""
+        self.histogram_btn.setEnabled(True)
+        plot_color_hist(hists, title, dark=self._is_dark_theme())
+
+    def _on_hist_failed(self, message):
+        """Report a failed histogram computation."""
+        self.histogram_btn.setEnabled(True)
+        QMessageBox.critical(self, "Histogram", f"Error computing histogram:\n{message}")
 
     def _is_dark_theme(self):
         """Infer dark mode from the current Qt palette."""
@@ -130,38 +167,78 @@ class SirilHistogramInterface(QWidget):
 
 def compute_and_plot_color_hist(data, title, bins=256, save_path=None, show=True, dark=False, linear=False, block=None):
     """Compute and plot the color histogram of the given image data."""
+    plot_color_hist(compute_color_hist(data, bins), title, save_path, show, dark, linear, block)
+
+def compute_color_hist(data, bins=256):
+    """Compute the B, G and R histograms of the given image data, normalized to 0-255."""
 
-    # tweak for sirils odd channel layout
-    if data.ndim == 3 and data.shape[0] in (3, 4):
-        data = np.transpose(data, (1, 2, 0))
+    # work on planes (3,H,W), which is sirils channel layout
+    if data.ndim == 3 and data.shape[0] not in (3, 4):
+        data = np.moveaxis(data, -1, 0)
 
-    # If grayscale, replicate channels
+    # If grayscale, replicate channels (as a view, no copies)
     if data.ndim == 2:
-        data = np.stack([data] * 3, axis=-1)
+        data = np.broadcast_to(data, (3,) + data.shape)
 
-    # sanity check for rgb or grayscale images - we expect 3 channels in the last dimension after the above adjustments
-    if data.ndim != 3 or data.shape[2] < 3:
+    # sanity check for rgb or grayscale images - we expect 3 channels in the first dimension after the above adjustments
+    if data.ndim != 3 or data.shape[0] < 3:
         raise ValueError('Expected a 3-channel color image in FITS (H,W,3) or (3,H,W).')
-
-    chans8 = []
-    for c in range(3):
-        chan = np.array(data[..., c], dtype=np.float64)
-        chan = np.nan_to_num(chan, nan=np.nanmin(chan))
-        lo, hi = np.nanmin(chan), np.nanmax(chan)
-        if hi == lo:
-            chan8 = np.zeros_like(chan, dtype=np.uint8)
-        else:
-            chan_norm = (chan - lo) / (hi - lo)
-            chan8 = (np.clip(chan_norm, 0.0, 1.0) * 255).astype(np.uint8)
-        chans8.append(chan8)
-
-    img_rgb = np.stack(chans8, axis=-1)
-    img_bgr = img_rgb[..., ::-1]
+    data = data[:3]
+
+    levels = np.zeros((3, 256), dtype=np.int64)
+    rows = max(1, HIST_BLOCK_PIXELS // data.shape[2])
+
+    if data.dtype in (np.uint8, np.uint16):
+        # integer data: count the raw values, the range and the 0-255 levels then follow
+        # from the counts alone with a lookup table, no per pixel float math at all
+        n = np.iinfo(data.dtype).max + 1
+        counts = np.zeros((3, n), dtype=np.int64)
+        for y in range(0, data.shape[1], rows):
+            for i in range(3):
+                counts[i] += np.bincount(data[i, y:y + rows].ravel(), minlength=n)
+        value = np.arange(n, dtype=np.float64)
+        for i in range(3):
+            used = np.flatnonzero(counts[i])
+            lo, hi = value[used[0]], value[used[-1]]
+            # same float64 divide then scale as the float path, so the maximum lands in level 255
+            span = hi - lo if hi > lo else 1.0
+            lut = (np.clip((value - lo) / span, 0.0, 1.0) * 255).astype(np.uint8)
+            levels[i] = np.bincount(lut, weights=counts[i], minlength=256)
+    else:
+        # per channel range in float64, flat channels divide by 1 and so map to 0
+        lo = np.nanmin(data, axis=(1, 2)).astype(np.float64)[:, np.newaxis, np.newaxis]
+        hi = np.nanmax(data, axis=(1, 2)).astype(np.float64)[:, np.newaxis, np.newaxis]
+        span = np.where(hi > lo, hi - lo, 1.0)
+
+        # normalize to 0-255 and count the levels of each channel a block of rows at a time,
+        # so neither the normalized image nor the 8 bit one is ever built in full.
+        # Divide by the range before scaling to 255 and stay in float64: multiplying by
+        # 255 / (hi - lo) in float32 rounds the channel maximum down to level 254
+        for y in range(0, data.shape[1], rows):
+            norm = data[:, y:y + rows] - lo
+            norm /= span
+            # NaNs count as the channel minimum
+            np.nan_to_num(norm, copy=False, nan=0.0)
+            np.clip(norm, 0.0, 1.0, out=norm)
+            norm *= 255
+            chunk = norm.astype(np.uint8)
+            for i in range(3):
+                levels[i] += np.bincount(chunk[i].ravel(), minlength=256)
+
+    # merge the levels into uniform bins like cv2.calcHist, in B, G, R order to match fill_colors
+    bin_of_level = np.arange(256) * bins // 256
+    return [np.bincount(bin_of_level, weights=levels[i], minlength=bins) for i in (2, 1, 0)]
+
+def plot_color_hist(hists, title, save_path=None, show=True, dark=False, linear=False, block=None):
+    """Plot B, G and R histograms from compute_color_hist."""
+    # pyplot pulls in the whole matplotlib stack, only load it once there is something to plot
+    import matplotlib.pyplot as plt
+
+    bins = len(hists[0])
 
     # Apply dark mode style if requested
     if dark:
         bg_color = '#2b2b2b'  # dark gray
-        plt.style.use('dark_background')
         fill_colors = ('deepskyblue', 'lime', 'salmon')
         edge_alpha = 0.95
         fill_alpha = 0.45
@@ -173,31 +250,46 @@ def compute_and_plot_color_hist(data, title, bins=256, save_path=None, show=True
         fill_alpha = 0.35
         text_color = 'k'
 
-    # Create figure and axes; set facecolor for dark background
-    fig, ax = plt.subplots(num="Siril Histogram", figsize=(8, 5), facecolor=bg_color)
-    if bg_color is not None:
-        ax.set_facecolor(bg_color)
-        # adjust tick and spine colors for visibility
-        ax.tick_params(colors=text_color)
-        for spine in ax.spines.values():
-            spine.set_color(text_color)
-
-    ax.ticklabel_format(style='plain', axis='y')
-
-    x = np.arange(bins)
-    for i, color in enumerate(fill_colors):
-        hist = cv2.calcHist([img_bgr], [i], None, [bins], [0, 256]).flatten()
-        ax.fill_between(x, hist, color=color, alpha=fill_alpha, step='mid')
-        ax.plot(x, hist, color=color, linewidth=0.9, alpha=edge_alpha)
+    # bin edges centred on each level so every step sits over its bin
+    edges = np.arange(bins + 1) - 0.5
+    if plt.fignum_exists(HIST_FIGURE):
+        # the histogram window is still open - keep the figure and swap the data under each step patch
+        fig = plt.figure(HIST_FIGURE)
+        ax = fig.axes[0]
+        for i, hist in enumerate(hists):
+            ax.patches[2 * i].set_data(hist, edges)
+            ax.patches[2 * i + 1].set_data(hist, edges)
+    else:
+        # dark style only while the figure and its artists are built, rcParams stay untouched
+        with plt.style.context('dark_background' if dark else {}):
+            # Create figure and axes; set facecolor for dark background
+            fig, ax = plt.subplots(num=HIST_FIGURE, figsize=(8, 5), facecolor=bg_color)
+            if bg_color is not None:
+                ax.set_facecolor(bg_color)
+                # adjust tick and spine colors for visibility
+                ax.tick_params(colors=text_color)
+                for spine in ax.spines.values():
+                    spine.set_color(text_color)
+
+            ax.ticklabel_format(style='plain', axis='y')
+
+            # a filled and an outlined stairs per channel, each a single path
+            for hist, color in zip(hists, fill_colors):
+                ax.stairs(hist, edges, fill=True, color=color, alpha=fill_alpha)
+                ax.stairs(hist, edges, color=color, linewidth=0.9, alpha=edge_alpha)
+
+            # hide x-axis values and ticks - we've normalized to 0-255 bins, so the x-axix values are meaningless
+            ax.tick_params(axis='x', which='both', bottom=False, top=False, labelbottom=False)
+
     ax.set_xlim([0, bins - 1])
+    ax.relim()
+    ax.autoscale_view()
 
     # set text and title colors based on dark mode
     ax.set_title(f'{title}', color=text_color)
 
-    # hide x-axis values and ticks - we've normalized to 0-255 bins, so the x-axix values are meaningless
-    ax.tick_params(axis='x', which='both', bottom=False, top=False, labelbottom=False)
-
     plt.tight_layout()
+    fig.canvas.draw_idle()
     if save_path:
         fig.savefig(save_path, dpi=150, bbox_inches='tight', facecolor=fig.get_facecolor())
     if show and not save_path: